@@ -1,26 +1,37 @@
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+import orjson
 from app.schemas import HealthResponse
 from app.services.model import classifier
 from app.database import engine
 
 router = APIRouter()
 
-@router.get("/health", response_model=HealthResponse)
-def health_check():
-    """
-    Check system health.
-    """
+def _build_health_response() -> dict:
     # Simple check for now
     db_status = "healthy" 
     redis_status = "healthy" # Todo: Real check
     
-    return {
-        "status": "healthy",
-        "services": {
+    return HealthResponse(
+        status="healthy",
+        services={
             "postgres": db_status,
             "redis": redis_status,
             "model": "loaded" if classifier.model else "not_loaded"
         },
-        "model_loaded": classifier.model is not None
-    }
+        model_loaded=classifier.model is not None
+    ).model_dump()
+
+# The healthy response never changes once the model is loaded, so liveness
+# probes are served prebuilt JSON bytes. Returning a Response skips
+# response_model validation and serialization; HealthResponse still documents it.
+_HEALTHY_BYTES = orjson.dumps(_build_health_response()) if classifier.model is not None else None
+
+@router.get("/health", response_model=HealthResponse)
+def health_check():
+    """
+    Check system health.
+    """
+    if _HEALTHY_BYTES is not None:
+        return Response(content=_HEALTHY_BYTES, media_type="application/json")
+    return _build_health_response()
@@ -1,29 +1,96 @@
 
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.models import Job, Prediction, JobStatus
-from app.schemas import JobResponse, PredictionResponse, JobCreate
+from app.schemas import JobResponse, JobListResponse, PredictionResponse
 from app.services.model import classifier
 from app.services.cache import cache
-from app.utils.image_utils import validate_image
-from app.utils.hash_utils import calculate_image_hash
-from app.workers.tasks import process_batch_images
+from app.utils.hash_utils import calculate_file_hash
+from app.workers.tasks import process_batch_images, UPLOAD_DIR
 import uuid
 import time
+import base64
 import json
+import orjson
 import shutil
 import os
 import zipfile
 import io
 import pandas as pd
+from datetime import datetime
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from app.config import settings
 
 router = APIRouter(prefix="/jobs", tags=["Jobs"])
 
+def _extract_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, target_path: str) -> str:
+    """Decompress a single ZIP member to target_path and return the path."""
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    with zf.open(info) as src, open(target_path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    return target_path
+
+def _extract_zip_images(fileobj, upload_root: str) -> list:
+    """Extract the image members of a ZIP upload into upload_root."""
+    fileobj.seek(0)
+    with zipfile.ZipFile(fileobj) as zf:
+        members = {}  # target_path -> info
+        for info in zf.infolist():
+            name = info.filename
+            if info.is_dir() or os.path.basename(name).startswith('.'):
+                continue
+            if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                continue
+
+            # Guard against path traversal (e.g. "../../etc/passwd")
+            target_path = os.path.abspath(os.path.join(upload_root, name))
+            if not target_path.startswith(upload_root + os.sep):
+                continue
+
+            # A repeated member name keeps its last entry, as extractall's
+            # overwrite did; two threads must never write the same path
+            members.pop(target_path, None)
+            members[target_path] = info
+
+        # Members decompress in parallel; ZipFile serialises the raw reads
+        # on its shared handle while zlib releases the GIL.
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            return list(executor.map(lambda m: _extract_member(zf, m[1], m[0]), members.items()))
+
+SSE_HEARTBEAT_SECONDS = 15
+
+def _sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+async def _job_events(job_id: str, pubsub, status: str, total_images: int, progress: dict):
+    """
+    Yield SSE frames for a job until it reaches a terminal status.
+    Waits on an asyncio PubSub, so an open stream holds no threadpool slot.
+    """
+    terminal = (JobStatus.COMPLETED.value, JobStatus.FAILED.value)
+    try:
+        yield _sse("progress", {"status": status, "total_images": total_images, **progress})
+        while status not in terminal:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_HEARTBEAT_SECONDS)
+            if message is None:
+                # Comment frame; lets a dropped client surface as a write error
+                yield b": keep-alive\n\n"
+                continue
+            if message["channel"].endswith(b":done"):
+                status = message["data"].decode()
+            progress = await cache.get_job_progress_async(job_id) or progress
+            yield _sse("progress", {"status": status, "total_images": total_images, **progress})
+        yield _sse("done", {"status": status})
+    finally:
+        await pubsub.aclose()
+
 @router.get("/{job_id}/results/download")
-def export_job_results(job_id: str, db: Session = Depends(get_db)):
+def export_job_results(job_id: uuid.UUID, db: Session = Depends(get_db)):
     """
     Export job results as a CSV file.
     """
@@ -72,43 +139,29 @@ async def batch_classify_images(
 
     # 1. Create Job ID and Temp Directory
     job_id = str(uuid.uuid4())
-    upload_dir = os.path.join("data", "uploads", job_id)
+    upload_dir = os.path.join(UPLOAD_DIR, job_id)
     os.makedirs(upload_dir, exist_ok=True)
     
-    zip_path = os.path.join(upload_dir, "upload.zip")
+    upload_root = os.path.abspath(upload_dir)
 
     try:
-        # 2. Save Uploaded ZIP
-        with open(zip_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # 3. Extract ZIP
-        extracted_images = []
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(upload_dir)
-            
-            # 4. Filter for valid images
-            for root, dirs, files in os.walk(upload_dir):
-                for filename in files:
-                    if filename.lower().endswith(('.png', '.jpg', '.jpeg')) and not filename.startswith('.'):
-                        full_path = os.path.join(root, filename)
-                        extracted_images.append(os.path.abspath(full_path))
+        # 2. Extract valid images straight from the uploaded file, off the event loop
+        extracted_images = await run_in_threadpool(_extract_zip_images, file.file, upload_root)
         
         if not extracted_images:
             shutil.rmtree(upload_dir)
             raise HTTPException(status_code=400, detail="No valid images found in ZIP.")
 
-        # 5. Create Job Record
+        # 3. Create Job Record
         job = Job(
             id=job_id,
-            status=JobStatus.PENDING,
+            status=JobStatus.PENDING.value,
             total_images=len(extracted_images)
         )
         db.add(job)
         db.commit()
-        db.refresh(job)
 
-        # 6. Dispatch Celery Task
+        # 4. Dispatch Celery Task
         process_batch_images.delay(extracted_images, job_id)
 
         return {
@@ -131,33 +184,34 @@ async def classify_image(file: UploadFile = File(...)):
     """
     Classify a single image (Synchronous for Phase 1/2).
     Includes Redis Caching (Phase 2).
+    Responses are built internally and returned as ORJSONResponse, which
+    skips PredictionResponse validation; response_model only documents them.
     """
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image.")
     
-    contents = await file.read()
-    
-    if not validate_image(contents):
-        raise HTTPException(status_code=400, detail="Invalid image file.")
+    # Hashing, Redis and inference are blocking calls; run them in the
+    # threadpool so concurrent uploads are not serialised on the event loop.
+    # The upload is streamed from its spooled file rather than read whole.
 
     # 1. Calculate Image Hash
-    image_hash = calculate_image_hash(contents)
+    image_hash = await run_in_threadpool(calculate_file_hash, file.file)
 
     # 2. Check Cache
-    cached_result = cache.get_prediction(image_hash)
+    cached_result = await run_in_threadpool(cache.get_prediction, image_hash)
     if cached_result:
-        return {
+        return ORJSONResponse(content={
             "filename": file.filename,
             "predicted_class": cached_result["class"],
             "confidence": cached_result["confidence"],
             "inference_time": 0.0, # Instant
             "top_3_classes": cached_result.get("top_3_classes", []),
             "from_cache": True
-        }
+        })
 
     try:
         start_time = time.time()
-        result = classifier.predict(contents)
+        result = await run_in_threadpool(classifier.predict, file.file)
         inference_time = (time.time() - start_time) * 1000 # ms
         
         # 3. Cache the result
@@ -167,33 +221,87 @@ async def classify_image(file: UploadFile = File(...)):
             "top_3_classes": [], # Todo: Populate this from model
             "cached_at": time.time()
         }
-        cache.set_prediction(image_hash, cache_data)
+        await run_in_threadpool(cache.set_prediction, image_hash, cache_data)
         
-        return {
+        return ORJSONResponse(content={
             "filename": file.filename,
             "predicted_class": result["class"],
             "confidence": result["confidence"],
             "inference_time": inference_time,
             "top_3_classes": [], 
             "from_cache": False
-        }
+        })
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=list[JobResponse])
-def read_jobs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@router.get("/", response_model=JobListResponse)
+def read_jobs(cursor: Optional[str] = None, limit: int = 100, db: Session = Depends(get_db)):
     """
-    List all jobs.
+    List jobs, newest first.
+    Pass the returned next_cursor back as ?cursor= to fetch the next page.
+    The cursor is an opaque URL-safe token for "<created_at>,<id>", so jobs
+    sharing a timestamp are neither skipped nor repeated across pages, and
+    the timestamp's "+00:00" can't be mangled in a query string.
     """
-    jobs = db.query(Job).offset(skip).limit(limit).all()
-    return jobs
+    query = db.query(Job)
+    if cursor:
+        try:
+            c_ts, c_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit(",", 1)
+            c_ts, c_id = datetime.fromisoformat(c_ts), uuid.UUID(c_id)
+        except ValueError:
+            # binascii.Error and UnicodeDecodeError are ValueErrors too
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(tuple_(Job.created_at, Job.id) < (c_ts, c_id))
+    jobs = query.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit).all()
+    return {
+        "items": jobs,
+        "next_cursor": base64.urlsafe_b64encode(f"{jobs[-1].created_at.isoformat()},{jobs[-1].id}".encode()).decode() if jobs else None
+    }
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: uuid.UUID, db: Session = Depends(get_db)):
+    """
+    Stream job progress as Server-Sent Events until the job finishes.
+    The job row is read once; later updates come from the worker over Redis pub/sub.
+    """
+    # Subscribe before reading the row so a job finishing in between isn't missed
+    pubsub = await cache.subscribe_job_events_async(str(job_id))
+    job = await run_in_threadpool(lambda: db.query(Job).filter(Job.id == job_id).first())
+    if job is None:
+        await pubsub.aclose()
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    progress = await cache.get_job_progress_async(str(job_id)) or {
+        "processed": job.processed_images or 0,
+        "cached": job.cached_images or 0,
+        "failed": job.failed_images or 0,
+    }
+    return StreamingResponse(
+        _job_events(str(job_id), pubsub, job.status, job.total_images, progress),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
 
 @router.get("/{job_id}", response_model=JobResponse)
-def read_job(job_id: str, db: Session = Depends(get_db)):
+def read_job(job_id: uuid.UUID, db: Session = Depends(get_db)):
     """
     Get job status.
+    Running batch jobs only write their counters to Postgres when they finish,
+    so live progress is overlaid from the worker's Redis counters.
     """
     job = db.query(Job).filter(Job.id == job_id).first()
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    return job
+
+    response = JobResponse.model_validate(job)
+    if job.status not in (JobStatus.COMPLETED.value, JobStatus.FAILED.value):
+        progress = cache.get_job_progress(str(job_id))
+        if progress:
+            response = response.model_copy(update={
+                "processed_images": progress["processed"],
+                "failed_images": progress["failed"],
+                "cache_hit_rate": (progress["cached"] / progress["processed"]) * 100 if progress["processed"] else 0.0,
+            })
+    return response
@@ -5,6 +5,7 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "PulmoScan"
     API_V1_STR: str = "/api/v1"
     DEBUG: bool = False
+    THREADPOOL_SIZE: int = 32
     
     # Database
     DATABASE_URL: str
@@ -21,7 +22,11 @@ class Settings(BaseSettings):
     # ML
     MODEL_PATH: str = "models/covid/mobilenetv3_best.pth"
     DEVICE: str = "cpu"
-    BATCH_SIZE: int = 32
+    BATCH_SIZE: int = 32  # Initial micro-batch size for batch inference
+    MAX_BATCH: int = 128
+    TARGET_LATENCY_MS: float = 1000.0  # Per forward pass; batches shrink above this
+    ORT_INTRA_OP_THREADS: int = 0  # 0 = split the CPU cores evenly across INFERENCE_PROCESSES
+    INFERENCE_PROCESSES: int = 1  # Processes on this host running inference (API workers + Celery children)
     CACHE_ENABLED: bool = True
 
     class Config:
@@ -4,7 +4,13 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+# Multi-row executemany batches bulk prediction inserts into pages of
+# 500 rows per INSERT ... VALUES statement
+engine = create_engine(
+    settings.DATABASE_URL,
+    executemany_mode="values_plus_batch",
+    insertmanyvalues_page_size=500,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
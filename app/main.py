@@ -1,5 +1,7 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import anyio
 from app.api import health, jobs
 from app.database import Base, engine
 from app.config import settings
@@ -10,6 +12,8 @@ async def lifespan(app: FastAPI):
     # Create DB tables
     Base.metadata.create_all(bind=engine)
     print("Database tables created.")
+    # Size the threadpool used for blocking work offloaded from async endpoints
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
     yield
 
 app = FastAPI(
@@ -17,6 +21,7 @@ app = FastAPI(
     description="High-performance COVID-19 X-ray Classification API",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
@@ -1,9 +1,11 @@
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, JSON, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, JSON, Boolean, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
+import uuid
 
 class JobStatus(str, enum.Enum):
     PENDING = "pending"
@@ -18,9 +20,11 @@ class ModelType(str, enum.Enum):
 class Job(Base):
     __tablename__ = "jobs"
 
-    id = Column(String, primary_key=True, index=True)
-    status = Column(Enum(JobStatus), default=JobStatus.PENDING)
-    model_type = Column(Enum(ModelType), default=ModelType.COVID)
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Plain short strings: rows hydrate without enum coercion, and the
+    # status index serves "WHERE status = 'pending'" polling
+    status = Column(String(16), default=JobStatus.PENDING.value, index=True)
+    model_type = Column(String(16), default=ModelType.COVID.value)
     
     total_images = Column(Integer, default=0)
     processed_images = Column(Integer, default=0)
@@ -36,11 +40,17 @@ class Job(Base):
 
     predictions = relationship("Prediction", back_populates="job")
 
+    # Keyset pagination on GET /jobs walks (created_at, id) newest-first;
+    # id breaks ties between jobs created in the same instant
+    __table_args__ = (
+        Index("ix_jobs_created_at_id", created_at.desc(), id.desc()),
+    )
+
 class Prediction(Base):
     __tablename__ = "predictions"
 
     id = Column(Integer, primary_key=True, index=True)
-    job_id = Column(String, ForeignKey("jobs.id"))
+    job_id = Column(UUID(as_uuid=True), ForeignKey("jobs.id"))
     
     image_filename = Column(String)
     image_hash = Column(String, index=True)
@@ -53,3 +63,8 @@ class Prediction(Base):
     from_cache = Column(Boolean, default=False)
     
     job = relationship("Job", back_populates="predictions")
+
+    # One row per image in a job; lets inserts use ON CONFLICT DO NOTHING
+    __table_args__ = (
+        Index("uq_predictions_job_file_hash", job_id, image_filename, image_hash, unique=True),
+    )
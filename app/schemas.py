@@ -2,6 +2,7 @@
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from datetime import datetime
+from uuid import UUID
 from enum import Enum
 
 class JobStatus(str, Enum):
@@ -30,7 +31,7 @@ class JobCreate(JobBase):
     pass
 
 class JobResponse(JobBase):
-    id: str
+    id: UUID
     status: JobStatus
     created_at: datetime
     processed_images: int
@@ -40,6 +41,10 @@ class JobResponse(JobBase):
     class Config:
         from_attributes = True
 
+class JobListResponse(BaseModel):
+    items: List[JobResponse]
+    next_cursor: Optional[str] = None
+
 class HealthResponse(BaseModel):
     status: str
     services: Dict[str, str]
@@ -1,26 +1,79 @@
-import json
+import orjson
 import redis
-from typing import Optional, Any
+from redis import asyncio as aioredis
+from typing import Optional, Any, Dict, List
 from app.config import settings
 
+# Predictions are stored as Redis hashes; these fields are decoded from their
+# raw bytes, anything else comes back as a str.
+_FLOAT_FIELDS = {"confidence", "cached_at", "processing_time_ms"}
+_BOOL_FIELDS = {"from_cache"}
+_JSON_FIELDS = {"top_3_classes"}
+
+def _encode_prediction(prediction: dict) -> Dict[str, Any]:
+    mapping = {}
+    for field, value in prediction.items():
+        if field in _JSON_FIELDS:
+            mapping[field] = orjson.dumps(value)
+        elif field in _BOOL_FIELDS:
+            mapping[field] = int(bool(value))
+        elif value is not None:
+            mapping[field] = value
+    return mapping
+
+def _decode_prediction(data: Dict[bytes, bytes]) -> dict:
+    prediction = {}
+    for raw_field, value in data.items():
+        field = raw_field.decode()
+        if field in _FLOAT_FIELDS:
+            prediction[field] = float(value)
+        elif field in _BOOL_FIELDS:
+            prediction[field] = value == b"1"
+        elif field in _JSON_FIELDS:
+            prediction[field] = orjson.loads(value)
+        else:
+            prediction[field] = value.decode()
+    return prediction
+
+_PROGRESS_FIELDS = ("processed", "cached", "failed")
+
+def _progress_keys(job_id: str) -> List[str]:
+    return [f"job:{job_id}:{name}" for name in _PROGRESS_FIELDS]
+
+def _decode_progress(raw: List[Optional[bytes]]) -> Optional[dict]:
+    if all(value is None for value in raw):
+        return None
+    return {name: int(value or 0) for name, value in zip(_PROGRESS_FIELDS, raw)}
+
 class RedisCache:
     def __init__(self):
-        self.client = redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.client = redis.from_url(settings.REDIS_URL, decode_responses=False)  # Fields are decoded per type
+        # Event-loop client for handlers that wait on Redis without holding a
+        # threadpool slot (SSE streams); connects lazily on first use
+        self.async_client = aioredis.from_url(settings.REDIS_URL, decode_responses=False)
         self.default_ttl = 604800  # 7 days in seconds
+        self.progress_ttl = 86400  # 1 day in seconds
+
+    def _queue_set(self, pipe, image_hash: str, prediction: dict, ttl: Optional[int]) -> None:
+        """Queue replacing one prediction hash (DEL + HSET + EXPIRE) on a pipeline."""
+        key = f"prediction:{image_hash}"
+        pipe.delete(key)
+        pipe.hset(key, mapping=_encode_prediction(prediction))
+        pipe.expire(key, ttl or self.default_ttl)
 
     def get_prediction(self, image_hash: str) -> Optional[dict]:
         """
         Get prediction from cache by image hash.
-        Returns deserialized JSON or None if not found.
+        Returns the decoded prediction hash or None if not found.
         """
         if not settings.CACHE_ENABLED:
             return None
             
         key = f"prediction:{image_hash}"
         try:
-            data = self.client.get(key)
+            data = self.client.hgetall(key)
             if data:
-                return json.loads(data)
+                return _decode_prediction(data)
         except redis.RedisError:
             # Fail silently on cache errors to avoid breaking the app
             pass
@@ -33,16 +86,116 @@ class RedisCache:
         if not settings.CACHE_ENABLED:
             return
 
-        key = f"prediction:{image_hash}"
         try:
-            self.client.set(
-                key, 
-                json.dumps(prediction), 
-                ex=ttl or self.default_ttl
-            )
+            pipe = self.client.pipeline()
+            self._queue_set(pipe, image_hash, prediction, ttl)
+            pipe.execute()
         except redis.RedisError:
             pass
 
+    def get_predictions(self, image_hashes: List[str]) -> List[Optional[dict]]:
+        """
+        Get predictions for many image hashes in a single pipelined round trip.
+        Returns a list aligned with image_hashes, with None for misses.
+        """
+        if not settings.CACHE_ENABLED or not image_hashes:
+            return [None] * len(image_hashes)
+
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for image_hash in image_hashes:
+                pipe.hgetall(f"prediction:{image_hash}")
+            raw = pipe.execute()
+            return [_decode_prediction(data) if data else None for data in raw]
+        except redis.RedisError:
+            return [None] * len(image_hashes)
+
+    def set_predictions(self, predictions: Dict[str, dict], ttl: int = None) -> None:
+        """
+        Store many predictions (image hash -> prediction) with one pipelined round trip.
+        """
+        if not settings.CACHE_ENABLED or not predictions:
+            return
+
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for image_hash, prediction in predictions.items():
+                self._queue_set(pipe, image_hash, prediction, ttl)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def incr_job_progress(self, job_id: str, processed: int = 0, cached: int = 0, failed: int = 0) -> None:
+        """
+        Bump a job's live progress counters (job:{job_id}:processed, ...) in one round trip.
+        Postgres only receives the counters at checkpoints; pollers read these instead,
+        and subscribers to job:{job_id}:progress are notified.
+        """
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for name, amount in (("processed", processed), ("cached", cached), ("failed", failed)):
+                key = f"job:{job_id}:{name}"
+                pipe.incrby(key, amount)
+                pipe.expire(key, self.progress_ttl)
+            # Wake event-stream listeners; they re-read the counters themselves
+            pipe.publish(f"job:{job_id}:progress", processed)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def get_job_progress(self, job_id: str) -> Optional[dict]:
+        """
+        Get a job's live progress counters.
+        Returns None if the job has no counters yet or Redis is unavailable.
+        """
+        try:
+            raw = self.client.mget(_progress_keys(job_id))
+        except redis.RedisError:
+            return None
+        return _decode_progress(raw)
+
+    async def get_job_progress_async(self, job_id: str) -> Optional[dict]:
+        """Awaitable get_job_progress on the event-loop client."""
+        try:
+            raw = await self.async_client.mget(_progress_keys(job_id))
+        except redis.RedisError:
+            return None
+        return _decode_progress(raw)
+
+    def publish_job_done(self, job_id: str, status: str) -> None:
+        """Announce a job's terminal status on its job:{job_id}:done channel."""
+        try:
+            self.client.publish(f"job:{job_id}:done", status)
+        except redis.RedisError:
+            pass
+
+    def subscribe_job_done(self, job_id: str):
+        """
+        Return a PubSub subscribed to a job's done channel.
+        Subscribe before checking the job's state so the message can't be missed.
+        """
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"job:{job_id}:done")
+        return pubsub
+
+    def subscribe_job_events(self, job_id: str):
+        """
+        Return a PubSub subscribed to both a job's progress and done channels.
+        Messages arrive with the channel name so callers can tell them apart.
+        """
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f"job:{job_id}:progress", f"job:{job_id}:done")
+        return pubsub
+
+    async def subscribe_job_events_async(self, job_id: str):
+        """
+        Awaitable subscribe_job_events returning a redis.asyncio PubSub, so
+        waiting for messages yields the event loop instead of a pool thread.
+        """
+        pubsub = self.async_client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(f"job:{job_id}:progress", f"job:{job_id}:done")
+        return pubsub
+
     def get_stats(self) -> dict:
         """Get basic cache statistics."""
         try:
@@ -1,36 +1,95 @@
 import torch
 import torch.nn as nn
-from torchvision import models, transforms
-from PIL import Image
-import io
+from torchvision import models
+from torchvision.io import decode_image, ImageReadMode
+from torchvision.transforms import v2 as transforms
+import os
+import threading
 import time
+import numpy as np
+from app.config import settings
+from app.utils.file_utils import read_file_buffer
 
-MODEL_PATH = "models/covid/mobilenetv3_best.pth"
+MODEL_PATH = settings.MODEL_PATH
 CLASSES = ['COVID', 'Normal', 'Viral Pneumonia']
 
 class COVIDClassifier:
     def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.model = self._load_model()
-        self.transforms = transforms.Compose([
-            transforms.Resize(256),
+        self._onnx = MODEL_PATH.endswith(".onnx")
+        if self._onnx:
+            self.device = torch.device("cpu")
+        else:
+            self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # ONNX sessions are built on first use in each process (see model);
+        # the other backends load here
+        self._model_lock = threading.Lock()
+        self._model_pid = None
+        self._model = None if self._onnx else self._load_model()
+        # Tensor-native pipeline: resize/crop on the decoded uint8 image,
+        # then scale to float and normalize, without going through PIL.
+        self.resize = transforms.Compose([
+            transforms.Resize(256, antialias=True),
             transforms.CenterCrop(224),
-            transforms.ToTensor(),
+        ])
+        self.normalize = transforms.Compose([
+            transforms.ToDtype(torch.float32, scale=True),
             transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
         ])
 
+    @property
+    def model(self):
+        """
+        The loaded backend, or None if it failed to load.
+        An ORT session owns an intra-op thread pool whose threads don't survive
+        fork(), so it is never built at import: each process (API worker,
+        Celery prefork child) builds its own on first use.
+        """
+        if self._onnx and self._model_pid != os.getpid():
+            with self._model_lock:
+                if self._model_pid != os.getpid():
+                    self._model = self._load_model()
+                    self._model_pid = os.getpid()
+        return self._model
+
     def _load_model(self):
+        """
+        Load the model from MODEL_PATH. The backend is picked by extension:
+            *.onnx    -> ONNX Runtime session (FP32 or INT8 export)
+            *.int8.pt -> TorchScript INT8 model from scripts/quantize_model.py
+            otherwise -> FP32 state_dict loaded into MobileNetV3-Large
+        """
         try:
             print(f"Loading model from {MODEL_PATH}...")
+            if MODEL_PATH.endswith(".onnx"):
+                model = self._load_onnx_session()
+                print("Model loaded successfully.")
+                return model
+
+            if MODEL_PATH.endswith(".int8.pt"):
+                # Quantized kernels only exist on CPU
+                self.device = torch.device("cpu")
+                model = torch.jit.load(MODEL_PATH, map_location=self.device)
+                model.eval()
+                print("Model loaded successfully.")
+                return model
+
             model = models.mobilenet_v3_large(weights=None) 
             num_ftrs = model.classifier[3].in_features
             model.classifier[3] = nn.Linear(num_ftrs, len(CLASSES))
             
-            state_dict = torch.load(MODEL_PATH, map_location=self.device)
-            model.load_state_dict(state_dict)
+            # weights_only skips the pickle VM; mmap pages tensors in lazily, and
+            # assign=True keeps them as the parameters instead of copying, so
+            # forked Celery workers share the read-only weight pages.
+            state_dict = torch.load(MODEL_PATH, map_location=self.device, weights_only=True, mmap=True)
+            model.load_state_dict(state_dict, assign=True)
             
             model = model.to(self.device)
             model.eval()
+
+            # Trace once so inference skips Python per-op dispatch
+            example_input = torch.randn(1, 3, 224, 224, device=self.device)
+            with torch.no_grad():
+                model = torch.jit.trace(model, example_input)
             print("Model loaded successfully.")
             return model
         except FileNotFoundError:
@@ -40,17 +99,95 @@ class COVIDClassifier:
             print(f"Error loading model: {e}")
             return None
 
-    def predict(self, image_bytes):
+    def _load_onnx_session(self):
+        import onnxruntime as ort
+
+        if not os.path.exists(MODEL_PATH):
+            raise FileNotFoundError(MODEL_PATH)
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # MobileNetV3 is a single chain of ops, so parallelism comes from
+        # intra-op threads within each conv rather than ORT_PARALLEL
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # Every API worker and Celery child has its own session; giving each
+        # one thread per core would oversubscribe the host
+        sess_options.intra_op_num_threads = settings.ORT_INTRA_OP_THREADS or max(1, os.cpu_count() // settings.INFERENCE_PROCESSES)
+        # The arena and memory patterns let ORT reuse intermediate buffers
+        # across runs of the same shape instead of reallocating them
+        sess_options.enable_cpu_mem_arena = True
+        sess_options.enable_mem_pattern = True
+        # IO bindings and output buffers are per thread: the API runs
+        # predictions concurrently from its threadpool
+        self._ort_local = threading.local()
+        return ort.InferenceSession(MODEL_PATH, sess_options=sess_options, providers=["CPUExecutionProvider"])
+
+    def _run_onnx(self, batch):
+        """Run the ORT session on a (B, 3, 224, 224) float32 array through a reused IOBinding."""
+        import onnxruntime as ort
+
+        local = self._ort_local
+        if not hasattr(local, "io_binding"):
+            local.io_binding = self.model.io_binding()
+            local.outputs = {}  # batch size -> preallocated output OrtValue
+
+        output = local.outputs.get(len(batch))
+        if output is None:
+            output = ort.OrtValue.ortvalue_from_shape_and_type((len(batch), len(CLASSES)), np.float32, "cpu")
+            local.outputs[len(batch)] = output
+
+        io_binding = local.io_binding
+        io_binding.bind_cpu_input(self.model.get_inputs()[0].name, batch)
+        io_binding.bind_ortvalue_output(self.model.get_outputs()[0].name, output)
+        self.model.run_with_iobinding(io_binding)
+        return output.numpy()
+
+    def _resize(self, image):
+        """Decode image bytes (or a binary file object) into a resized uint8 (3, 224, 224) tensor."""
+        if isinstance(image, bytes):
+            # frombuffer warns on read-only buffers; callers that can should
+            # pass a bytearray to skip this copy
+            image = bytearray(image)
+        elif not isinstance(image, bytearray):
+            image = read_file_buffer(image)
+        try:
+            decoded = decode_image(torch.frombuffer(image, dtype=torch.uint8), mode=ImageReadMode.RGB)
+        except (RuntimeError, ValueError) as e:
+            raise ValueError("Invalid image file.") from e
+        return self.resize(decoded)
+
+    def _preprocess(self, image):
+        """Decode image bytes (or a binary file object) into a normalized (3, 224, 224) tensor."""
+        return self.normalize(self._resize(image))
+
+    def _forward(self, batch_tensor):
+        """Run the loaded backend on a (B, 3, 224, 224) tensor and return logits."""
+        if not isinstance(self.model, torch.nn.Module):
+            # ONNX Runtime session
+            model_input = self.model.get_inputs()[0]
+            batch = np.ascontiguousarray(batch_tensor.numpy())
+            if model_input.shape[0] == 1:
+                # Exported without a dynamic batch axis: run one image at a time
+                outputs = [self._run_onnx(batch[i:i + 1]) for i in range(len(batch))]
+                return torch.from_numpy(np.concatenate(outputs))
+            return torch.from_numpy(self._run_onnx(batch))
+        return self.model(batch_tensor)
+
+    def predict(self, image):
+        """
+        Predict a single image.
+        args:
+            image: Image bytes or a readable binary file object.
+        """
         if self.model is None:
             raise RuntimeError("Model is not loaded.")
 
         t0 = time.time()
         
-        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        tensor = self.transforms(image).unsqueeze(0).to(self.device)
+        tensor = self._preprocess(image).unsqueeze(0).to(self.device)
 
-        with torch.no_grad():
-            outputs = self.model(tensor)
+        with torch.inference_mode():
+            outputs = self._forward(tensor)
             probabilities = torch.nn.functional.softmax(outputs, dim=1)
             confidence, predicted_idx = torch.max(probabilities, 1)
 
@@ -78,16 +215,13 @@ class COVIDClassifier:
 
         t0 = time.time()
         
-        tensors = []
-        for img_bytes in image_bytes_list:
-            image = Image.open(io.BytesIO(img_bytes)).convert('RGB')
-            tensors.append(self.transforms(image))
+        tensors = [self._preprocess(img_bytes) for img_bytes in image_bytes_list]
         
         # Stack into a batch tensor: (Batch_Size, C, H, W)
         batch_tensor = torch.stack(tensors).to(self.device)
 
-        with torch.no_grad():
-            outputs = self.model(batch_tensor)
+        with torch.inference_mode():
+            outputs = self._forward(batch_tensor)
             probabilities = torch.nn.functional.softmax(outputs, dim=1)
             confidences, predicted_idxs = torch.max(probabilities, 1)
 
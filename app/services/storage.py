@@ -1,10 +1,21 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Objects above 8MB go up as 8MB parts, four in flight at once; the transfer
+# manager reuses its part buffers across the upload
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK_SIZE,
+    multipart_chunksize=MULTIPART_CHUNK_SIZE,
+    max_concurrency=4,
+    use_threads=True,
+)
+
 class StorageService:
     def __init__(self):
         # Ensure endpoint starts with http:// if not present
@@ -36,7 +47,7 @@ class StorageService:
     def upload_file(self, file_obj, object_name):
         """Upload a file-like object to S3."""
         try:
-            self.s3_client.upload_fileobj(file_obj, self.bucket, object_name)
+            self.s3_client.upload_fileobj(file_obj, self.bucket, object_name, Config=TRANSFER_CONFIG)
             return object_name
         except ClientError as e:
             logger.error(f"Failed to upload file: {e}")
@@ -45,7 +56,16 @@ class StorageService:
     def download_file(self, object_name, file_path):
         """Download a file from S3 to local path."""
         try:
-            self.s3_client.download_file(self.bucket, object_name, file_path)
+            self.s3_client.download_file(self.bucket, object_name, file_path, Config=TRANSFER_CONFIG)
+            return True
+        except ClientError as e:
+            logger.error(f"Failed to download file: {e}")
+            return False
+
+    def download_fileobj(self, object_name, file_obj):
+        """Download a file from S3 into a writable file-like object."""
+        try:
+            self.s3_client.download_fileobj(self.bucket, object_name, file_obj, Config=TRANSFER_CONFIG)
             return True
         except ClientError as e:
             logger.error(f"Failed to download file: {e}")
@@ -0,0 +1,23 @@
+import os
+from typing import BinaryIO
+
+def read_file_buffer(file_obj: BinaryIO) -> bytearray:
+    """
+    Read a seekable binary file object from the start into a writable
+    bytearray with readinto, so the data is copied once and can be handed
+    straight to torch.frombuffer.
+    """
+    size = file_obj.seek(0, os.SEEK_END)
+    file_obj.seek(0)
+    buf = bytearray(size)
+    view = memoryview(buf)
+    read = 0
+    while read < size:
+        n = file_obj.readinto(view[read:])
+        if not n:
+            break
+        read += n
+    view.release()
+    # The file shrank between seek and read
+    del buf[read:]
+    return buf
@@ -1,6 +1,23 @@
 
-import hashlib
+import xxhash
+from typing import BinaryIO
 
 def calculate_image_hash(image_bytes: bytes) -> str:
-    """Calculate SHA-256 hash of image bytes."""
-    return hashlib.sha256(image_bytes).hexdigest()
+    """
+    Calculate xxh3-128 hash of image bytes.
+    The hash is only used as a cache key, so a fast non-cryptographic
+    digest is sufficient.
+    """
+    return xxhash.xxh3_128_hexdigest(image_bytes)
+
+def calculate_file_hash(file_obj: BinaryIO, chunk_size: int = 65536) -> str:
+    """
+    Calculate xxh3-128 hash of a binary file object, reading it in chunks
+    so the whole upload is never held in memory. Rewinds the file afterwards.
+    """
+    h = xxhash.xxh3_128()
+    file_obj.seek(0)
+    while chunk := file_obj.read(chunk_size):
+        h.update(chunk)
+    file_obj.seek(0)
+    return h.hexdigest()
@@ -1,30 +1,101 @@
 import time
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
 from app.services.model import classifier
 from app.services.cache import cache
 from app.database import SessionLocal
+from app.config import settings
 from app.models import Job, Prediction, JobStatus
 from app.utils.hash_utils import calculate_image_hash
+from app.utils.file_utils import read_file_buffer
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from typing import List
 import logging
 from sqlalchemy.sql import func
-from tqdm import tqdm
 
 logger = logging.getLogger(__name__)
 
+# Threads used to read batch images from disk; reads release the GIL
+READ_WORKERS = 16
+
+# Batch uploads are extracted to UPLOAD_DIR/<job_id>/, keeping archive folders
+UPLOAD_DIR = os.path.join("data", "uploads")
+
+def _image_filename(path: str, job_id: str) -> str:
+    """
+    Name to store for an image: its path inside the job's upload directory,
+    so same-named files from different ZIP folders stay separate rows under
+    the (job_id, image_filename, image_hash) unique index.
+    Paths outside the upload directory fall back to the basename.
+    """
+    upload_root = os.path.abspath(os.path.join(UPLOAD_DIR, str(job_id)))
+    path = os.path.abspath(path)
+    if path.startswith(upload_root + os.sep):
+        return os.path.relpath(path, upload_root)
+    return os.path.basename(path)
+
+def _insert_predictions(db: Session, rows: List[dict]) -> None:
+    """
+    Insert prediction rows as an executemany, which the engine batches into
+    multi-row INSERT ... VALUES statements.
+    Rows already stored for the same job/file/hash (e.g. from a redelivered
+    task) are skipped by the database instead of duplicated.
+    """
+    if not rows:
+        return
+    stmt = insert(Prediction).on_conflict_do_nothing(
+        index_elements=["job_id", "image_filename", "image_hash"]
+    )
+    db.execute(stmt, rows)
+
+def _read_image(path: str):
+    """
+    Read an image file, returning (path, bytearray, None) or (path, None, error)
+    so one unreadable file doesn't abort the pool's map.
+    """
+    try:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Image not found: {path}")
+        with open(path, "rb") as f:
+            return path, read_file_buffer(f), None
+    except Exception as e:
+        return path, None, e
+
+def _predict_single(image_bytes: bytes, metadata: dict, job_id: str):
+    """
+    Predict one image of a micro-batch, returning None instead of raising
+    when it can't be decoded so its neighbours still get results.
+    """
+    try:
+        return classifier.predict_batch([image_bytes])[0]
+    except ValueError as e:
+        logger.error(f"Error processing image {metadata['image_filenames'][0]} for batch job {job_id}: {e}")
+        return None
+
+def _next_batch_size(batch_size: int, chunk_len: int, elapsed_ms: float) -> int:
+    """
+    Halve the batch size when a forward pass overshoots TARGET_LATENCY_MS,
+    double it (up to MAX_BATCH) when a full batch finishes well under target.
+    """
+    if elapsed_ms > settings.TARGET_LATENCY_MS:
+        return max(1, batch_size // 2)
+    if chunk_len == batch_size and elapsed_ms < settings.TARGET_LATENCY_MS / 2:
+        return min(settings.MAX_BATCH, batch_size * 2)
+    return batch_size
+
 @shared_task(bind=True)
 def process_single_image(self, image_path: str, job_id: str):
     """
     Process a single image asynchronously.
     """
-    print(f"[Task {job_id}] Starting process_single_image for {image_path}")
     try:
         db = SessionLocal()
-        print(f"[Task {job_id}] DB Session created")
     except Exception as e:
-        print(f"[Task {job_id}] FAILED to create DB session: {e}")
+        logger.error(f"Failed to create DB session for job {job_id}: {e}")
         raise e
 
     try:
@@ -34,25 +105,29 @@ def process_single_image(self, image_path: str, job_id: str):
             logger.error(f"Job {job_id} not found.")
             return JobStatus.FAILED
         
-        # Only transition from PENDING to PROCESSING once
+        # Only transition from PENDING to PROCESSING once; like every other
+        # change below, this is committed in the task's single transaction
         if job.status == JobStatus.PENDING:
-            print(f"[Task {job_id}] Setting status to PROCESSING")
-            job.status = JobStatus.PROCESSING
+            job.status = JobStatus.PROCESSING.value
             job.started_at = func.now()
-            db.commit()
-            db.refresh(job)
 
         # 2. Load Image
         if not os.path.exists(image_path):
             logger.error(f"Image not found: {image_path}")
             job.failed_images += 1
             job.processed_images += 1
+            # Same completion check as the error path, so SSE listeners hear about it
+            job_done = job.processed_images + job.failed_images == job.total_images
+            if job_done:
+                job.status = JobStatus.FAILED.value
+                job.completed_at = func.now()
             db.commit()
+            if job_done:
+                cache.publish_job_done(job_id, JobStatus.FAILED.value)
             return JobStatus.FAILED
 
         with open(image_path, "rb") as f:
-            image_bytes = f.read()
-        print(f"[Task {job_id}] Image loaded")
+            image_bytes = read_file_buffer(f)
 
         # 3. Calculate Hash
         image_hash = calculate_image_hash(image_bytes)
@@ -65,17 +140,14 @@ def process_single_image(self, image_path: str, job_id: str):
         processing_time = 0.0
 
         if cached_result:
-            print(f"[Task {job_id}] Cache HIT")
             from_cache = True
             prediction_data = cached_result
             job.cached_images += 1
         else:
             # 5. Inference
-            print(f"[Task {job_id}] Starting Inference...")
             start_time = time.time()
             result = classifier.predict(image_bytes)
             processing_time = (time.time() - start_time) * 1000
-            print(f"[Task {job_id}] Inference DONE in {processing_time:.2f}ms")
             
             prediction_data = {
                 "class": result["class"],
@@ -89,18 +161,16 @@ def process_single_image(self, image_path: str, job_id: str):
             cache.set_prediction(image_hash, cache_data)
 
         # 6. Save Prediction
-        print(f"[Task {job_id}] Saving prediction to DB")
-        prediction = Prediction(
-            job_id=job_id,
-            image_filename=os.path.basename(image_path),
-            image_hash=image_hash,
-            predicted_class=prediction_data["class"],
-            confidence=prediction_data["confidence"],
-            top_3_classes=prediction_data.get("top_3_classes"),
-            processing_time_ms=processing_time,
-            from_cache=from_cache
-        )
-        db.add(prediction)
+        _insert_predictions(db, [{
+            "job_id": job_id,
+            "image_filename": _image_filename(image_path, job_id),
+            "image_hash": image_hash,
+            "predicted_class": prediction_data["class"],
+            "confidence": prediction_data["confidence"],
+            "top_3_classes": prediction_data.get("top_3_classes"),
+            "processing_time_ms": processing_time,
+            "from_cache": from_cache
+        }])
         
         # 7. Update Job Progress
         job.processed_images += 1
@@ -108,12 +178,15 @@ def process_single_image(self, image_path: str, job_id: str):
             job.cache_hit_rate = (job.cached_images / job.processed_images) * 100
         
         # For a single image task, mark job completed here if it's the only one
+        final_status = None
         if job.processed_images + job.failed_images == job.total_images:
-            job.status = JobStatus.COMPLETED if job.failed_images == 0 else JobStatus.FAILED
+            final_status = JobStatus.COMPLETED.value if job.failed_images == 0 else JobStatus.FAILED.value
+            job.status = final_status
             job.completed_at = func.now()
         
         db.commit()
-        print(f"[Task {job_id}] DONE & Committed")
+        if final_status:
+            cache.publish_job_done(job_id, final_status)
         
         return {
             "status": "success",
@@ -123,7 +196,6 @@ def process_single_image(self, image_path: str, job_id: str):
 
     except Exception as e:
         logger.error(f"Error processing single image for job {job_id}: {e}")
-        print(f"[Task {job_id}] EXCEPTION: {e}")
         db.rollback()
         # Ensure job stats are updated even on unhandled error
         job = db.query(Job).filter(Job.id == job_id).first() 
@@ -132,14 +204,16 @@ def process_single_image(self, image_path: str, job_id: str):
             job.processed_images += 1
             if job.total_images > 0:
                 job.cache_hit_rate = (job.cached_images / job.processed_images) * 100
-            if job.processed_images + job.failed_images == job.total_images:
-                job.status = JobStatus.FAILED
+            job_done = job.processed_images + job.failed_images == job.total_images
+            if job_done:
+                job.status = JobStatus.FAILED.value
                 job.completed_at = func.now()
             db.commit()
+            if job_done:
+                cache.publish_job_done(job_id, JobStatus.FAILED.value)
         raise e
     finally:
         db.close()
-        print(f"[Task {job_id}] DB Session Closed")
 
 
 @shared_task(bind=True)
@@ -156,14 +230,14 @@ def process_batch_images(self, image_paths: List[str], job_id: str):
 
         # Only transition from PENDING to PROCESSING once
         if job.status == JobStatus.PENDING:
-            job.status = JobStatus.PROCESSING
+            job.status = JobStatus.PROCESSING.value
             job.started_at = func.now()
             db.commit()
             db.refresh(job)
 
         images_to_infer_bytes = []
-        images_to_infer_metadata = [] # Stores (original_path, hash) for non-cached images
-        predictions_to_add = [] # Collect all predictions (cached + inferred) for bulk add
+        images_to_infer_metadata = [] # Stores hash and duplicate filenames for non-cached images
+        predictions_to_add = [] # Collect all prediction rows (cached + inferred) for bulk insert
         
         total_images_in_batch = len(image_paths)
         
@@ -171,85 +245,120 @@ def process_batch_images(self, image_paths: List[str], job_id: str):
         current_failed = 0
         current_cached = 0
 
-        for original_path in tqdm(image_paths, desc=f"Job {job_id}"):
-            image_filename = os.path.basename(original_path)
-            image_bytes = None
-            image_hash = None
-                    
-            try:
-                if not os.path.exists(original_path):
-                    raise FileNotFoundError(f"Image not found: {original_path}")
-
-                with open(original_path, "rb") as f:
-                    image_bytes = f.read()
-                
-                image_hash = calculate_image_hash(image_bytes)
-                cached_result = cache.get_prediction(image_hash)
-
-                if cached_result:
-                    prediction_data = {
-                        "class": cached_result["class"],
-                        "confidence": cached_result["confidence"],
-                        "top_3_classes": cached_result.get("top_3_classes", []),
-                        "processing_time_ms": 0.0, # Cached, instant
-                        "from_cache": True
-                    }
-                    predictions_to_add.append(Prediction(
-                        job_id=job_id,
-                        image_filename=image_filename,
-                        image_hash=image_hash,
-                        predicted_class=prediction_data["class"],
-                        confidence=prediction_data["confidence"],
-                        top_3_classes=prediction_data["top_3_classes"],
-                        processing_time_ms=prediction_data["processing_time_ms"],
-                        from_cache=True
-                    ))
-                    current_cached += 1
-                else:
-                    images_to_infer_bytes.append(image_bytes)
-                    images_to_infer_metadata.append({
-                        "original_path": original_path,
+        # Read and hash every image first so the cache can be queried in one round trip
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+            read_results = list(executor.map(_read_image, image_paths))
+
+        readable = [] # (original_path, image_filename, image_bytes) for files that could be read
+        for original_path, image_bytes, read_error in read_results:
+            image_filename = _image_filename(original_path, job_id)
+            if read_error is None:
+                readable.append((original_path, image_filename, image_bytes))
+                continue
+
+            logger.error(f"Error processing image {original_path} for batch job {job_id}: {read_error}")
+            current_failed += 1
+            # Save a 'failed' prediction record
+            predictions_to_add.append({
+                "job_id": job_id,
+                "image_filename": image_filename if image_filename else "unknown",
+                "image_hash": "error",
+                "predicted_class": "FAILED",
+                "confidence": 0.0,
+                "top_3_classes": [],
+                "processing_time_ms": 0.0,
+                "from_cache": False 
+            })
+
+        # Hash the buffers in parallel; xxhash releases the GIL on large buffers
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            image_hashes = list(executor.map(calculate_image_hash, [image_bytes for _, _, image_bytes in readable]))
+
+        # Group duplicate files by hash so each unique image is looked up and inferred once
+        images_by_hash = {} # image_hash -> (image_bytes, [image_filename, ...])
+        for (_, image_filename, image_bytes), image_hash in zip(readable, image_hashes):
+            images_by_hash.setdefault(image_hash, (image_bytes, []))[1].append(image_filename)
+
+        unique_hashes = list(images_by_hash)
+        cached_results = cache.get_predictions(unique_hashes)
+
+        for image_hash, cached_result in zip(unique_hashes, cached_results):
+            image_bytes, image_filenames = images_by_hash[image_hash]
+            if cached_result:
+                prediction_data = {
+                    "class": cached_result["class"],
+                    "confidence": cached_result["confidence"],
+                    "top_3_classes": cached_result.get("top_3_classes", []),
+                    "processing_time_ms": 0.0, # Cached, instant
+                    "from_cache": True
+                }
+                for image_filename in image_filenames:
+                    predictions_to_add.append({
+                        "job_id": job_id,
                         "image_filename": image_filename,
-                        "image_hash": image_hash
+                        "image_hash": image_hash,
+                        "predicted_class": prediction_data["class"],
+                        "confidence": prediction_data["confidence"],
+                        "top_3_classes": prediction_data["top_3_classes"],
+                        "processing_time_ms": prediction_data["processing_time_ms"],
+                        "from_cache": True
                     })
+                current_cached += len(image_filenames)
+            else:
+                images_to_infer_bytes.append(image_bytes)
+                images_to_infer_metadata.append({
+                    "image_filenames": image_filenames,
+                    "image_hash": image_hash
+                })
+
+        # Publish live progress for the read and cache stages in one round trip
+        cache.incr_job_progress(job_id, processed=current_cached, cached=current_cached, failed=current_failed)
 
-            except Exception as e:
-                logger.error(f"Error processing image {original_path} for batch job {job_id}: {e}")
-                current_failed += 1
-                # Save a 'failed' prediction record
-                predictions_to_add.append(Prediction(
-                    job_id=job_id,
-                    image_filename=image_filename if image_filename else "unknown",
-                    image_hash=image_hash if image_hash else "error",
-                    predicted_class="FAILED",
-                    confidence=0.0,
-                    top_3_classes=[],
-                    processing_time_ms=0.0,
-                    from_cache=False 
-                ))
-            
-            # Update job progress after each image is processed (or failed)
-            current_processed_total = current_cached + (len(images_to_infer_metadata)) + current_failed # Total images considered so far
-            
-            job.processed_images = current_processed_total - current_failed
-            job.failed_images = current_failed
-            job.cached_images = current_cached
-            if job.total_images > 0 and job.processed_images > 0:
-                job.cache_hit_rate = (job.cached_images / job.processed_images) * 100
-            elif job.processed_images == 0:
-                job.cache_hit_rate = 0.0
-            
-            # Commit intermediate progress to allow external polling
-            db.commit()
-            db.refresh(job) # Refresh job object to prevent stale data in session
-        
         # Perform Batch Inference for non-cached images
         if images_to_infer_bytes:
-            batch_inference_results = classifier.predict_batch(images_to_infer_bytes)
+            # Micro-batch the queue, adapting the batch size to measured latency
+            batch_inference_results = []
+            pending = deque(zip(images_to_infer_bytes, images_to_infer_metadata))
+            batch_size = min(settings.BATCH_SIZE, settings.MAX_BATCH)
+            while pending:
+                chunk = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+                chunk_bytes = [image_bytes for image_bytes, _ in chunk]
+                start_time = time.time()
+                try:
+                    chunk_results = classifier.predict_batch(chunk_bytes)
+                except ValueError:
+                    # One undecodable image fails the whole stack; redo the
+                    # chunk image by image so only the bad ones are lost
+                    chunk_results = [_predict_single(image_bytes, metadata, job_id) for image_bytes, metadata in chunk]
+                else:
+                    # Only a real batched pass says anything about latency
+                    elapsed_ms = (time.time() - start_time) * 1000
+                    batch_size = _next_batch_size(batch_size, len(chunk), elapsed_ms)
+                chunk_failed = sum(len(metadata["image_filenames"]) for (_, metadata), result in zip(chunk, chunk_results) if result is None)
+                current_failed += chunk_failed
+                batch_inference_results.extend(zip((metadata for _, metadata in chunk), chunk_results))
+                cache.incr_job_progress(
+                    job_id,
+                    processed=sum(len(metadata["image_filenames"]) for _, metadata in chunk) - chunk_failed,
+                    failed=chunk_failed,
+                )
             
-            for i, result in enumerate(batch_inference_results):
-                metadata = images_to_infer_metadata[i]
-                
+            new_cache_entries = {}
+            for metadata, result in batch_inference_results:
+                if result is None:
+                    for image_filename in metadata["image_filenames"]:
+                        predictions_to_add.append({
+                            "job_id": job_id,
+                            "image_filename": image_filename,
+                            "image_hash": "error",
+                            "predicted_class": "FAILED",
+                            "confidence": 0.0,
+                            "top_3_classes": [],
+                            "processing_time_ms": 0.0,
+                            "from_cache": False
+                        })
+                    continue
+
                 prediction_data = {
                     "class": result["class"],
                     "confidence": result["confidence"],
@@ -261,53 +370,64 @@ def process_batch_images(self, image_paths: List[str], job_id: str):
                 # Cache the new result
                 cache_data = prediction_data.copy()
                 cache_data["cached_at"] = time.time()
-                cache.set_prediction(metadata["image_hash"], cache_data)
-
-                predictions_to_add.append(Prediction(
-                    job_id=job_id,
-                    image_filename=metadata["image_filename"],
-                    image_hash=metadata["image_hash"],
-                    predicted_class=prediction_data["class"],
-                    confidence=prediction_data["confidence"],
-                    top_3_classes=prediction_data["top_3_classes"],
-                    processing_time_ms=prediction_data["processing_time_ms"],
-                    from_cache=False
-                ))
+                new_cache_entries[metadata["image_hash"]] = cache_data
+
+                # Fan the single inference out to every duplicate of the image
+                for image_filename in metadata["image_filenames"]:
+                    predictions_to_add.append({
+                        "job_id": job_id,
+                        "image_filename": image_filename,
+                        "image_hash": metadata["image_hash"],
+                        "predicted_class": prediction_data["class"],
+                        "confidence": prediction_data["confidence"],
+                        "top_3_classes": prediction_data["top_3_classes"],
+                        "processing_time_ms": prediction_data["processing_time_ms"],
+                        "from_cache": False
+                    })
+
+            cache.set_predictions(new_cache_entries)
         
-        # Add all collected predictions to the session
-        if predictions_to_add:
-            db.add_all(predictions_to_add)
+        # Insert all collected predictions in one statement
+        _insert_predictions(db, predictions_to_add)
 
         # Final Job Status Update
-        job.processed_images = total_images_in_batch - current_failed # Total successfully processed
-        job.failed_images = current_failed
-        job.cached_images = current_cached
-        
-        if job.total_images > 0 and job.processed_images > 0:
-            job.cache_hit_rate = (job.cached_images / job.processed_images) * 100
-        elif job.processed_images == 0:
-            job.cache_hit_rate = 0.0
+        processed = total_images_in_batch - current_failed # Total successfully processed
+        cache_hit_rate = (current_cached / processed) * 100 if processed > 0 else 0.0
 
         if current_failed == total_images_in_batch:
-            job.status = JobStatus.FAILED
+            final_status = JobStatus.FAILED.value
         elif current_failed > 0:
-            job.status = JobStatus.COMPLETED # Partially completed implies completed with some failures
+            final_status = JobStatus.COMPLETED.value # Partially completed implies completed with some failures
         else:
-            job.status = JobStatus.COMPLETED
+            final_status = JobStatus.COMPLETED.value
             
-        job.completed_at = func.now()
+        # Counters and status land in one UPDATE; live progress went through Redis
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(
+                processed_images=processed,
+                failed_images=current_failed,
+                cached_images=current_cached,
+                cache_hit_rate=cache_hit_rate,
+                status=final_status,
+                completed_at=func.now(),
+            )
+        )
         db.commit() # Final commit
+        cache.publish_job_done(job_id, final_status)
         
-        return job.status.value
+        return final_status
 
     except Exception as e:
         logger.error(f"Unhandled error in batch job {job_id}: {e}")
         db.rollback()
         job = db.query(Job).filter(Job.id == job_id).first() # Re-fetch in case of rollback
         if job:
-            job.status = JobStatus.FAILED
+            job.status = JobStatus.FAILED.value
             job.completed_at = func.now()
             db.commit()
+            cache.publish_job_done(job_id, JobStatus.FAILED.value)
         raise e
     finally:
         db.close()
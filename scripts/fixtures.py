@@ -0,0 +1,90 @@
+import io
+import os
+import shutil
+import time
+import zipfile
+from typing import BinaryIO, List, Tuple, Union
+from PIL import Image
+
+def _encode_png(color: Tuple[int, int, int]) -> bytes:
+    buf = io.BytesIO()
+    Image.new('RGB', (224, 224), color=color).save(buf, 'PNG', compress_level=1)
+    return buf.getvalue()
+
+def make_fixture_images(n: int, out_dir: str, base_color: Tuple[int, int, int] = (100, 100, 100), prefix: str = "img") -> List[str]:
+    """
+    Creates n identical dummy PNGs in out_dir and returns their absolute paths.
+    The PNG is encoded once; the other files are hardlinks to it (or copies
+    where the filesystem has no hardlinks), so setup cost doesn't grow with n.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if n <= 0:
+        return []
+
+    base_path = os.path.abspath(os.path.join(out_dir, f"{prefix}_0.png"))
+    with open(base_path, "wb") as f:
+        f.write(_encode_png(base_color))
+
+    paths = [base_path]
+    for i in range(1, n):
+        path = os.path.abspath(os.path.join(out_dir, f"{prefix}_{i}.png"))
+        try:
+            os.link(base_path, path)
+        except OSError:
+            shutil.copyfile(base_path, path)
+        paths.append(path)
+    return paths
+
+def make_fixture_zip(n: int, zip_path: Union[str, BinaryIO], base_color: Tuple[int, int, int] = (100, 100, 100), prefix: str = "img") -> Union[str, BinaryIO]:
+    """
+    Writes a ZIP of n identical dummy PNGs straight from memory and returns zip_path.
+    zip_path may be a path or a file object such as io.BytesIO; a file object
+    is rewound so it can be uploaded directly. Entries are stored uncompressed
+    (PNG is already compressed) and no per-image files touch the disk.
+    """
+    data = _encode_png(base_color)
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for i in range(n):
+            zf.writestr(f"{prefix}_{i}.png", data)
+    if hasattr(zip_path, "seek"):
+        zip_path.seek(0)
+    return zip_path
+
+def wait_for_job_done(job_id: str, get_status, timeout: float = 30.0) -> str:
+    """
+    Blocks until the job reaches a terminal status and returns it.
+    Listens on the worker's job:{job_id}:done channel; get_status() is called
+    once after subscribing in case the job finished before we were listening.
+    """
+    from app.services.cache import cache
+
+    pubsub = cache.subscribe_job_done(job_id)
+    try:
+        status = get_status()
+        deadline = time.time() + timeout
+        while status not in ("completed", "failed") and time.time() < deadline:
+            message = pubsub.get_message(timeout=max(deadline - time.time(), 0.01))
+            if message:
+                status = message["data"].decode()
+        return status
+    finally:
+        pubsub.close()
+
+def make_session_options():
+    """Tuned ORT options: full graph fusion, one intra-op thread per usable core, CPU arena."""
+    import onnxruntime as ort
+
+    so = ort.SessionOptions()
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    so.intra_op_num_threads = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    so.enable_cpu_mem_arena = True
+    return so
+
+def get_providers():
+    """Prefer oneDNN (VNNI int8 kernels) when this onnxruntime build ships it."""
+    import onnxruntime as ort
+
+    if 'DnnlExecutionProvider' in ort.get_available_providers():
+        return ['DnnlExecutionProvider', 'CPUExecutionProvider']
+    return ['CPUExecutionProvider']
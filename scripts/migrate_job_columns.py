@@ -0,0 +1,55 @@
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.getcwd())
+
+from sqlalchemy import text
+from app.database import engine
+
+# create_all() only creates missing tables, so databases created before the
+# jobs/predictions column changes keep the old schema:
+#   - jobs.id and predictions.job_id are VARCHAR, not UUID
+#   - jobs.status / jobs.model_type use the native enum types jobstatus /
+#     modeltype, which stored member *names* ('PENDING'), not values ('pending')
+#   - the status, (created_at, id) and per-job uniqueness indexes are missing
+# Every statement is idempotent, and all of them run in one transaction.
+STATEMENTS = [
+    # UUID keys; the foreign key has to come off while both sides change type
+    "ALTER TABLE predictions DROP CONSTRAINT IF EXISTS predictions_job_id_fkey",
+    "ALTER TABLE jobs ALTER COLUMN id TYPE UUID USING id::uuid",
+    "ALTER TABLE predictions ALTER COLUMN job_id TYPE UUID USING job_id::uuid",
+    "ALTER TABLE predictions ADD CONSTRAINT predictions_job_id_fkey FOREIGN KEY (job_id) REFERENCES jobs (id)",
+    # The primary key already indexes id
+    "DROP INDEX IF EXISTS ix_jobs_id",
+
+    # Enum columns -> VARCHAR(16) holding the lowercase enum values
+    "ALTER TABLE jobs ALTER COLUMN status TYPE VARCHAR(16) USING lower(status::text)",
+    "ALTER TABLE jobs ALTER COLUMN model_type TYPE VARCHAR(16) USING lower(model_type::text)",
+    "DROP TYPE IF EXISTS jobstatus",
+    "DROP TYPE IF EXISTS modeltype",
+
+    # Indexes declared in app/models.py
+    "CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status)",
+    "CREATE INDEX IF NOT EXISTS ix_jobs_created_at_id ON jobs (created_at DESC, id DESC)",
+    # Drop rows a redelivered task inserted twice, so the unique index can build
+    """
+    DELETE FROM predictions p
+    USING predictions q
+    WHERE p.job_id = q.job_id
+      AND p.image_filename IS NOT DISTINCT FROM q.image_filename
+      AND p.image_hash IS NOT DISTINCT FROM q.image_hash
+      AND p.id > q.id
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_predictions_job_file_hash ON predictions (job_id, image_filename, image_hash)",
+]
+
+def migrate():
+    print(f"Migrating jobs/predictions schema on {engine.url.render_as_string(hide_password=True)}")
+    with engine.begin() as conn:
+        for statement in STATEMENTS:
+            conn.execute(text(statement))
+    print("Migration complete.")
+
+if __name__ == "__main__":
+    migrate()
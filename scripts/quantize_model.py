@@ -0,0 +1,90 @@
+import torch
+import torch.nn as nn
+from torchvision import models, transforms
+from PIL import Image
+import glob
+import os
+import sys
+import argparse
+
+# Add project root to path
+sys.path.append(os.getcwd())
+
+MODEL_PATH = "models/covid/mobilenetv3_best.pth"
+QUANTIZED_PATH = "models/covid/mobilenetv3.int8.pt"
+DATA_DIR = "data/covid19"
+CLASSES = ['COVID', 'Normal', 'Viral Pneumonia']
+
+def load_pytorch_model():
+    print(f"Loading PyTorch model from {MODEL_PATH}...")
+    device = torch.device("cpu") # Quantized kernels are CPU-only
+    model = models.mobilenet_v3_large(weights=None)
+    num_ftrs = model.classifier[3].in_features
+    model.classifier[3] = nn.Linear(num_ftrs, len(CLASSES))
+    
+    state_dict = torch.load(MODEL_PATH, map_location=device)
+    model.load_state_dict(state_dict)
+    model.to(device)
+    model.eval()
+    return model
+
+def get_calibration_batches(limit_per_class=10, batch_size=8):
+    """Yields preprocessed batches of real X-rays for activation calibration."""
+    transform = transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+    ])
+
+    tensors = []
+    for class_name in CLASSES:
+        class_dir = os.path.join(DATA_DIR, class_name)
+        # Handle 'images' subdirectory if it exists (Kaggle dataset structure)
+        if os.path.exists(os.path.join(class_dir, 'images')):
+            class_dir = os.path.join(class_dir, 'images')
+
+        file_list = glob.glob(os.path.join(class_dir, "*.png")) + glob.glob(os.path.join(class_dir, "*.jpg"))
+        for img_path in file_list[:limit_per_class]:
+            tensors.append(transform(Image.open(img_path).convert('RGB')))
+
+    if not tensors:
+        print(f"No images found in {DATA_DIR}. Calibrating on random noise instead.")
+        tensors = [torch.randn(3, 224, 224) for _ in range(batch_size)]
+
+    for i in range(0, len(tensors), batch_size):
+        yield torch.stack(tensors[i:i + batch_size])
+
+def quantize_model(model, limit_per_class):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    print("Quantizing model to INT8 (x86 qconfig)...")
+    example_inputs = (torch.randn(1, 3, 224, 224),)
+    prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), example_inputs)
+
+    # Calibrate observers with representative inputs
+    with torch.inference_mode():
+        for batch in get_calibration_batches(limit_per_class):
+            prepared(batch)
+
+    quantized = convert_fx(prepared)
+
+    # Save as TorchScript so the API can torch.jit.load it without the scaffold
+    traced = torch.jit.trace(quantized, example_inputs)
+    torch.jit.save(traced, QUANTIZED_PATH)
+
+    original_size = os.path.getsize(MODEL_PATH) / (1024 * 1024)
+    quantized_size = os.path.getsize(QUANTIZED_PATH) / (1024 * 1024)
+    print(f"   Quantization success! Saved to {QUANTIZED_PATH}")
+    print(f"   Original: {original_size:.2f} MB")
+    print(f"   Quantized: {quantized_size:.2f} MB")
+    print(f"   Set MODEL_PATH={QUANTIZED_PATH} to serve it.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize the PyTorch model to INT8 for CPU inference")
+    parser.add_argument("--calibration-images", type=int, default=10, help="Calibration images per class")
+    args = parser.parse_args()
+
+    model = load_pytorch_model()
+    quantize_model(model, args.calibration_images)
@@ -3,7 +3,6 @@ import os
 import time
 import uuid
 import shutil
-from PIL import Image
 
 # Add project root to path
 sys.path.append(os.getcwd())
@@ -12,6 +11,7 @@ from app.database import SessionLocal
 from app.models import Job, JobStatus, Prediction
 from app.workers.tasks import process_batch_images
 from app.workers.celery_app import celery_app # Import to ensure config load
+from scripts.fixtures import make_fixture_images
 
 def test_batch_worker():
     print("--- Starting Celery BATCH Worker Integration Test ---")
@@ -27,13 +27,8 @@ def test_batch_worker():
     # 1. Create Dummy Images
     print(f"1. Creating {num_images} dummy images...")
     try:
-        for i in range(num_images):
-            img_path = os.path.join(test_dir, f"test_img_{i}.png")
-            # Vary color slightly to ensure unique hashes if needed, though simpler is fine
-            color = (i * 50 % 255, 100, 100) 
-            img = Image.new('RGB', (224, 224), color=color)
-            img.save(img_path)
-            image_paths.append(os.path.abspath(img_path))
+        # Identical files still yield one prediction row each (duplicates fan out)
+        image_paths = make_fixture_images(num_images, test_dir, prefix="test_img")
         print(f"   Created {len(image_paths)} images in {test_dir}")
     except Exception as e:
         print(f"   Error creating images: {e}")
@@ -44,7 +39,7 @@ def test_batch_worker():
     db = SessionLocal()
     job_id = str(uuid.uuid4())
     try:
-        job = Job(id=job_id, status=JobStatus.PENDING, total_images=num_images)
+        job = Job(id=job_id, status=JobStatus.PENDING.value, total_images=num_images)
         db.add(job)
         db.commit()
         print(f"   Created Job ID: {job_id}")
@@ -72,17 +67,21 @@ def test_batch_worker():
         return
 
     # 4. Monitor
-    print("4. Polling Database for Job completion...")
-    max_retries = 15 # Longer timeout for batch
+    print("4. Waiting for the task result...")
     success = False
-    
-    for i in range(max_retries):
-        db = SessionLocal()
+    try:
+        # Block on the Celery result backend instead of polling the database
+        task.get(timeout=15, propagate=False) # Longer timeout for batch
+    except Exception as e:
+        print(f"   Error waiting for task: {e}")
+
+    db = SessionLocal()
+    try:
         refreshed_job = db.query(Job).filter(Job.id == job_id).first()
         status = refreshed_job.status
         processed = refreshed_job.processed_images
         
-        print(f"   [{i+1}/{max_retries}] Job Status: {status} | Processed: {processed}/{num_images}")
+        print(f"   Job Status: {status} | Processed: {processed}/{num_images}")
         
         if status == JobStatus.COMPLETED:
             print("\nSUCCESS: Job marked as COMPLETED!")
@@ -96,16 +95,10 @@ def test_batch_worker():
                  success = True
             else:
                  print(f"      Prediction count mismatch! Expected {num_images}, got {pred_count}")
-            
-            db.close()
-            break
         elif status == JobStatus.FAILED:
             print("\nFAILURE: Job marked as FAILED.")
-            db.close()
-            break
-            
+    finally:
         db.close()
-        time.sleep(1)
 
     if not success:
         print("\nTIMEOUT: Job did not complete in time.")
@@ -22,7 +22,7 @@ def test_worker():
     db = SessionLocal()
     job_id = str(uuid.uuid4())
     try:
-        job = Job(id=job_id, status=JobStatus.PENDING, total_images=1)
+        job = Job(id=job_id, status=JobStatus.PENDING.value, total_images=1)
         db.add(job)
         db.commit()
         print(f"   Created Job ID: {job_id}")
@@ -64,27 +64,27 @@ def test_worker():
         return
 
     # 4. Monitor
-    print("4. Polling Database for Job completion...")
-    max_retries = 10
+    print("4. Waiting for the task result...")
     success = False
-    
-    for i in range(max_retries):
-        db = SessionLocal()
-        refreshed_job = db.query(Job).filter(Job.id == job_id).first()
-        status = refreshed_job.status
+    try:
+        # Block on the Celery result backend instead of polling the database
+        task.get(timeout=10, propagate=False)
+    except Exception as e:
+        print(f"   Error waiting for task: {e}")
+
+    db = SessionLocal()
+    try:
+        status = db.query(Job).filter(Job.id == job_id).first().status
+    finally:
         db.close()
-        
-        print(f"   [{i+1}/{max_retries}] Job Status: {status}")
-        
-        if status == JobStatus.COMPLETED:
-            print("\nSUCCESS: Job marked as COMPLETED by worker!")
-            success = True
-            break
-        elif status == JobStatus.FAILED:
-            print("\nFAILURE: Job marked as FAILED.")
-            break
-            
-        time.sleep(1)
+    
+    print(f"   Job Status: {status}")
+    
+    if status == JobStatus.COMPLETED:
+        print("\nSUCCESS: Job marked as COMPLETED by worker!")
+        success = True
+    elif status == JobStatus.FAILED:
+        print("\nFAILURE: Job marked as FAILED.")
 
     if not success:
         print("\nTIMEOUT: Job did not complete in time. Is the worker running?")
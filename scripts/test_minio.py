@@ -12,7 +12,6 @@ def test_minio_connection():
     
     test_content = b"Hello MinIO! This is a test file."
     object_name = "test_file.txt"
-    download_path = "downloaded_test_file.txt"
 
     # 1. Upload
     print(f"1. Uploading '{object_name}'...")
@@ -33,23 +32,35 @@ def test_minio_connection():
     else:
         print("     URL generation failed.")
 
-    # 3. Download
-    print(f"3. Downloading back to '{download_path}'...")
-    success = storage.download_file(object_name, download_path)
+    # 3. Download (into memory; nothing is written locally)
+    print("3. Downloading back into memory...")
+    downloaded = io.BytesIO()
+    success = storage.download_fileobj(object_name, downloaded)
     
     if success:
-        with open(download_path, "rb") as f:
-            content = f.read()
-        if content == test_content:
+        if downloaded.getvalue() == test_content:
             print("    Download successful and content matches.")
         else:
             print("   Content mismatch!")
     else:
         print("       Download failed.")
 
-    # Cleanup
-    if os.path.exists(download_path):
-        os.remove(download_path)
+    # 4. Multipart round trip (16 MB = two 8 MB parts)
+    large_object_name = "test_file_16mb.bin"
+    large_content = os.urandom(16 * 1024 * 1024)
+    print(f"4. Uploading 16 MB '{large_object_name}' (multipart)...")
+    if not storage.upload_file(io.BytesIO(large_content), large_object_name):
+        print("    Multipart upload failed.")
+        return
+
+    downloaded = io.BytesIO()
+    if storage.download_fileobj(large_object_name, downloaded):
+        if downloaded.getvalue() == large_content:
+            print("    Multipart round trip successful and content matches.")
+        else:
+            print("   Multipart content mismatch!")
+    else:
+        print("       Multipart download failed.")
 
 if __name__ == "__main__":
     test_minio_connection()
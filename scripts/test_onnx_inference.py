@@ -12,11 +12,20 @@ import glob
 # Add project root to path
 sys.path.append(os.getcwd())
 
+from scripts.fixtures import make_session_options, get_providers
+
 MODEL_PATH = "models/covid/mobilenetv3_best.pth"
 ONNX_PATH = "models/covid/mobilenetv3.onnx"
 QUANTIZED_PATH = "models/covid/mobilenetv3_int8.onnx"
 DATA_DIR = "data/covid19"
 CLASSES = ['COVID', 'Normal', 'Viral Pneumonia']
+EVAL_BATCH_SIZE = 32
+
+def get_int8_providers():
+    """OpenVINO compiles the QDQ graph into fused VNNI kernels; fall back to get_providers()."""
+    if 'OpenVINOExecutionProvider' in ort.get_available_providers():
+        return [('OpenVINOExecutionProvider', {'device_type': 'CPU'}), 'CPUExecutionProvider']
+    return get_providers()
 
 def load_pytorch_model():
     print("Loading PyTorch model...")
@@ -57,24 +66,26 @@ def get_real_images(limit_per_class=20):
         for img_path in file_list[:limit_per_class]:
             try:
                 img = Image.open(img_path).convert('RGB')
-                tensor = transform(img).unsqueeze(0)
-                images.append(tensor)
+                images.append(transform(img))
                 labels.append(idx)
             except Exception as e:
                 print(f"Skipping {img_path}: {e}")
                 
-    return images, labels
+    if not images:
+        return torch.empty(0, 3, 224, 224), np.array(labels, dtype=np.int64)
+    # One (N, 3, 224, 224) tensor so evaluation can slice it into batches
+    return torch.stack(images), np.array(labels, dtype=np.int64)
 
 def evaluate_accuracy(model_func, images, labels, model_type="Model"):
     correct = 0
     total = len(images)
     start_time = time.time()
     
-    for i, img_tensor in enumerate(images):
-        output = model_func(img_tensor)
-        pred = np.argmax(output)
-        if pred == labels[i]:
-            correct += 1
+    # Run EVAL_BATCH_SIZE images per call (the ONNX export has a dynamic batch axis)
+    for i in range(0, total, EVAL_BATCH_SIZE):
+        output = model_func(images[i:i + EVAL_BATCH_SIZE])
+        preds = np.argmax(output, axis=1)
+        correct += int((preds == labels[i:i + EVAL_BATCH_SIZE]).sum())
             
     duration = time.time() - start_time
     acc = 100 * correct / total
@@ -88,11 +99,11 @@ def test_inference():
     torch_model = load_pytorch_model()
     
     print(f"Loading ONNX model: {ONNX_PATH}...")
-    ort_session = ort.InferenceSession(ONNX_PATH)
+    ort_session = ort.InferenceSession(ONNX_PATH, sess_options=make_session_options(), providers=get_providers())
     
     print(f"Loading Quantized ONNX model: {QUANTIZED_PATH}...")
     try:
-        q_ort_session = ort.InferenceSession(QUANTIZED_PATH)
+        q_ort_session = ort.InferenceSession(QUANTIZED_PATH, sess_options=make_session_options(), providers=get_int8_providers())
     except Exception:
         q_ort_session = None
         print("Quantized model not found or invalid.")
@@ -107,7 +118,7 @@ def test_inference():
         return ort_session.run(None, inputs)[0]
         
     def run_q_onnx(tensor):
-        if not q_ort_session: return np.array([[0,0,0]])
+        if not q_ort_session: return np.zeros((len(tensor), len(CLASSES)))
         inputs = {q_ort_session.get_inputs()[0].name: to_numpy(tensor)}
         return q_ort_session.run(None, inputs)[0]
 
@@ -124,7 +135,7 @@ def test_inference():
     print("\n--- Accuracy Evaluation (Real Data) ---")
     images, labels = get_real_images(limit_per_class=50) # 150 images total
     
-    if not images:
+    if len(labels) == 0:
         print("No images found in data/covid19. Skipping accuracy test.")
     else:
         print(f"Evaluating on {len(images)} real images...")
@@ -132,12 +143,25 @@ def test_inference():
         acc_onnx, time_onnx = evaluate_accuracy(run_onnx, images, labels, "ONNX")
         
         if q_ort_session:
+            q_provider = q_ort_session.get_providers()[0]
             acc_q, time_q = evaluate_accuracy(run_q_onnx, images, labels, "ONNX (INT8)")
+
+            # Same INT8 model on the generic CPU EP, to show what the accelerated EP buys
+            cpu_result = None
+            if q_provider != 'CPUExecutionProvider':
+                q_cpu_session = ort.InferenceSession(QUANTIZED_PATH, sess_options=make_session_options(), providers=['CPUExecutionProvider'])
+                def run_q_cpu(tensor):
+                    inputs = {q_cpu_session.get_inputs()[0].name: to_numpy(tensor)}
+                    return q_cpu_session.run(None, inputs)[0]
+                cpu_result = evaluate_accuracy(run_q_cpu, images, labels, "ONNX (INT8 CPU)")
             
             print("\n--- Final Comparison ---")
             print(f"PyTorch:     {time_torch:.2f}ms, Accuracy: {acc_torch:.1f}%")
             print(f"ONNX:        {time_onnx:.2f}ms, Accuracy: {acc_onnx:.1f}% (Speedup: {time_torch/time_onnx:.2f}x)")
-            print(f"ONNX (INT8): {time_q:.2f}ms, Accuracy: {acc_q:.1f}% (Speedup: {time_torch/time_q:.2f}x)")
+            print(f"ONNX (INT8): {time_q:.2f}ms, Accuracy: {acc_q:.1f}% (Speedup: {time_torch/time_q:.2f}x) [{q_provider}]")
+            if cpu_result:
+                acc_q_cpu, time_q_cpu = cpu_result
+                print(f"ONNX (INT8): {time_q_cpu:.2f}ms, Accuracy: {acc_q_cpu:.1f}% (Speedup: {time_torch/time_q_cpu:.2f}x) [CPUExecutionProvider]")
 
 if __name__ == "__main__":
     test_inference()
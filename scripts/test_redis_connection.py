@@ -1,6 +1,7 @@
 import redis
 import os
 import sys
+from redis.utils import HIREDIS_AVAILABLE
 
 # Add project root to path
 sys.path.append(os.getcwd())
@@ -16,6 +17,8 @@ def test_redis_connection():
         # Attempt to ping the server
         client.ping()
         print("Successfully connected to Redis and received PONG!")
+        # redis-py picks the C parser automatically when hiredis is installed
+        print(f"RESP parser: {'hiredis' if HIREDIS_AVAILABLE else 'pure-python'}")
         return True
     except redis.exceptions.ConnectionError as e:
         print(f"Redis Connection Error: {e}")
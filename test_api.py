@@ -2,13 +2,38 @@
 import requests
 import time
 import sys
+import os
+import io
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 BASE_URL = "http://localhost:8000"
+CONCURRENCY = 16
+
+# One keep-alive session for every test; the pool holds a socket per concurrent worker
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=CONCURRENCY, pool_maxsize=CONCURRENCY))
+
+def _build_png_once(marker: bytes = b"") -> bytes:
+    """
+    Encode a dummy test image once, up front; requests wrap the same bytes.
+    Each 3-byte slice of marker recolours one pixel of the top row, so
+    distinct markers give distinct hashes (and distinct cache keys).
+    """
+    img = Image.new('RGB', (224, 224), color='red')
+    for x in range(len(marker) // 3):
+        img.putpixel((x, 0), tuple(marker[3 * x:3 * x + 3]))
+    img_byte_arr = io.BytesIO()
+    img.save(img_byte_arr, format='PNG')
+    return img_byte_arr.getvalue()
+
+_PAYLOAD = _build_png_once()
 
 def test_health():
     print("Testing Health Check...")
     try:
-        response = requests.get(f"{BASE_URL}/health")
+        response = SESSION.get(f"{BASE_URL}/health")
         response.raise_for_status()
         data = response.json()
         print(f"Health check: {data['status']}")
@@ -19,20 +44,11 @@ def test_health():
 
 def test_single_classification():
     print("\nTesting Single Image Classification...")
-    # Create a dummy image for testing
-    from PIL import Image
-    import io
-    
-    img = Image.new('RGB', (224, 224), color='red')
-    img_byte_arr = io.BytesIO()
-    img.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)
-    
-    files = {'file': ('test.png', img_byte_arr, 'image/png')}
+    files = {'file': ('test.png', io.BytesIO(_PAYLOAD), 'image/png')}
     
     try:
         start_time = time.time()
-        response = requests.post(f"{BASE_URL}/api/v1/jobs/classify", files=files)
+        response = SESSION.post(f"{BASE_URL}/api/v1/jobs/classify", files=files)
         response.raise_for_status()
         data = response.json()
         duration = (time.time() - start_time) * 1000
@@ -45,13 +61,41 @@ def test_single_classification():
         print(response.text if 'response' in locals() else "")
         return False
 
+def test_concurrent_classification(num_requests: int = 64):
+    print(f"\nTesting {num_requests} Concurrent Classifications ({CONCURRENCY} workers)...")
+    # A distinct image per request, salted per run, so every request misses the
+    # cache and the throughput covers inference and queuing, not cache reads
+    run_salt = os.urandom(3)
+    payloads = [_build_png_once(run_salt + i.to_bytes(3, "big")) for i in range(num_requests)]
+
+    def classify(payload):
+        response = SESSION.post(f"{BASE_URL}/api/v1/jobs/classify",
+                                files={'file': ('test.png', io.BytesIO(payload), 'image/png')})
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+            results = list(executor.map(classify, payloads))
+        duration = time.time() - start_time
+
+        # Expected to be 0; anything else means the number includes cache hits
+        cached = sum(1 for r in results if r.get("from_cache"))
+        print(f"Throughput: {num_requests / duration:.1f} req/s ({cached}/{num_requests} from cache)")
+        return True
+    except Exception as e:
+        print(f"Concurrent classification failed: {e}")
+        return False
+
 if __name__ == "__main__":
     print(f"Running tests against {BASE_URL}")
     
     health_ok = test_health()
     class_ok = test_single_classification()
+    concurrent_ok = test_concurrent_classification()
     
-    if health_ok and class_ok:
+    if health_ok and class_ok and concurrent_ok:
         print("\nAll tests passed!")
         sys.exit(0)
     else:
@@ -1,6 +1,5 @@
 import sys
 import os
-import time
 
 # Add current directory to path so we can import app
 sys.path.append(os.getcwd())
@@ -15,8 +14,7 @@ def test_cache():
         cache.set_prediction("test_hash_123", data)
         print("Set Key: prediction:test_hash_123")
         
-        # 2. Test Get
-        time.sleep(0.1) # Ensure write prop
+        # 2. Test Get (set_prediction returns once Redis has acknowledged the write)
         result = cache.get_prediction("test_hash_123")
         if result and result["class"] == "Test":
              print(f"Get Key (Hit): {result}")
@@ -30,6 +28,15 @@ def test_cache():
         else:
             print(f"Cache Miss failed. Got: {miss}")
             
+        # 4. Bulk set/get: one pipelined round trip each instead of one per hash
+        hashes = [f"test_hash_bulk_{i}" for i in range(10)]
+        cache.set_predictions({h: data for h in hashes})
+        results = cache.get_predictions(hashes + ["non_existent_hash"])
+        if all(r and r["class"] == "Test" for r in results[:-1]) and results[-1] is None:
+            print(f"Bulk Get (Pipelined): {len(hashes)} hits + 1 miss aligned correctly")
+        else:
+            print(f"Bulk Get Failed. Results: {results}")
+
         stats = cache.get_stats()
         print(f"Cache Stats: {stats}")
             